@@ -0,0 +1,605 @@
+import streamlit as st
+import sympy as sp
+from sympy.functions.elementary.trigonometric import TrigonometricFunction
+from sympy.printing.latex import LatexPrinter
+from sympy.integrals.manualintegrate import (
+    integral_steps, AddRule, URule, PartsRule, ConstantTimesRule, PowerRule,
+    TrigRule, TrigSubstitutionRule, AlternativeRule
+)
+from sympy.parsing.sympy_parser import T, convert_equals_signs
+import numpy as np
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import hashlib
+import importlib
+import subprocess
+from subprocess import CalledProcessError
+import shutil
+import tempfile
+import os
+import stat
+import warnings
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name):
+    # Imported on first use rather than at app start: numba alone adds seconds to a cold start
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+# --- Step-by-Step Rule Parser ---
+# Each handler returns (LaTeX line or None, child rules to visit in order)
+def add_step(rule):
+    return r"\item \textbf{Linearity Rule:} Break the integral into separate parts and evaluate them individually.", rule.substeps
+
+def u_step(rule):
+    u_str = sp.latex(rule.u_func)
+    # FIX: Doubled curly braces for \textbf{{...}}
+    return rf"\item \textbf{{U-Substitution:}} Let $u = {u_str}$. Substitute $u$ and $du$ into the integral.", [rule.substep]
+
+def parts_step(rule):
+    u_str = sp.latex(rule.u)
+    dv_str = sp.latex(rule.dv)
+    # FIX: Doubled curly braces for \textbf{{...}}
+    return rf"\item \textbf{{Integration by Parts:}} Let $u = {u_str}$ and $dv = {dv_str} \, dx$. Apply the formula $\int u \, dv = uv - \int v \, du$.", [rule.v_step, rule.second_step]
+
+def constant_times_step(rule):
+    c_str = sp.latex(rule.constant)
+    # FIX: Doubled curly braces for \textbf{{...}}
+    return rf"\item \textbf{{Constant Multiple:}} Factor out the constant ${c_str}$ from the integral.", [rule.substep]
+
+def power_step(rule):
+    return r"\item \textbf{Power Rule:} Apply the power rule for integration: $\int x^n \, dx = \frac{x^{n+1}}{n+1}$.", []
+
+def trig_step(rule):
+    return r"\item \textbf{Trigonometric Identity:} Evaluate using standard trigonometric integral formulas.", []
+
+def trig_substitution_step(rule):
+    func = sp.latex(rule.func)
+    # FIX: Doubled curly braces for \textbf{{...}}
+    return rf"\item \textbf{{Trig Substitution:}} Let $x = {func}$. Substitute to eliminate the radical.", [rule.substep]
+
+def alternative_step(rule):
+    # Only the first alternative is described; its siblings are never visited
+    if hasattr(rule, 'alternatives') and rule.alternatives:
+        return None, [rule.alternatives[0]]
+    return None, []
+
+def default_step(rule):
+    clean_name = rule.__class__.__name__.replace('Rule', '')
+    children = [rule.substep] if hasattr(rule, 'substep') else []
+    return rf"\item \textbf{{{clean_name} Applied:}} Evaluate the resulting expression.", children
+
+# Keyed on the exact rule type, matching the old class-name comparison without the string compares
+STEP_HANDLERS = {
+    AddRule: add_step,
+    URule: u_step,
+    PartsRule: parts_step,
+    ConstantTimesRule: constant_times_step,
+    PowerRule: power_step,
+    TrigRule: trig_step,
+    TrigSubstitutionRule: trig_substitution_step,
+    AlternativeRule: alternative_step,
+}
+
+ALGEBRAIC_FALLBACK_STEP = r"\item \textbf{Algebraic Processing:} The steps for this specific function rely on complex internal algorithms rather than standard elementary rules."
+
+def generate_step_latex(expr, x_var):
+    try:
+        rule_tree = integral_steps(expr, x_var)
+        clean_steps = []
+
+        # Explicit pre-order walk: no recursion limit on deeply nested rule trees
+        stack = deque([rule_tree])
+        while stack:
+            rule = stack.pop()
+            if rule is None: continue
+            handler = STEP_HANDLERS.get(type(rule), default_step)
+            line, children = handler(rule)
+            # Drop consecutive duplicates as they are produced rather than in a second pass
+            if line is not None and (not clean_steps or clean_steps[-1] != line):
+                clean_steps.append(line)
+            stack.extend(reversed(children))
+
+        if not clean_steps:
+            return r"\item \textbf{Direct Integration:} The antiderivative was found directly using standard integral tables."
+            
+        return "\n".join(clean_steps)
+        
+    except Exception as e:
+        return ALGEBRAIC_FALLBACK_STEP
+
+# --- Cached Symbolic Pipeline ---
+# Built once at import instead of resolving transformations='all' on every parse.
+# Same passes and order as 'all'; only the '=' -> Eq conversion is dropped. No local_dict:
+# pinning 'x' stops implicit application from binding 'sin x^2' as sin(x**2).
+X = sp.symbols('x')
+PARSE_TRANSFORMATIONS = tuple(t for t in T[:] if t is not convert_equals_signs)
+
+# Caps for the per-input caches so a long-running server stays bounded. Bound-keyed entries
+# multiply with every number_input step, so they get a smaller budget than per-function ones.
+FUNCTION_CACHE_ENTRIES = 256
+BOUNDS_CACHE_ENTRIES = 128
+
+# Vectorized replacements that return complex values outside the real domain instead of NaN
+DOMAIN_SAFE_FUNCS = {'sqrt': np.emath.sqrt, 'log': np.emath.log}
+
+# Pathological integrands can keep SymPy busy for minutes; give up after a few seconds.
+# Threads can't be killed, so the pool size caps how many runaway calls can pile up.
+SYMBOLIC_TIMEOUT = 5.0
+SYMBOLIC_WORKERS = 4
+SYMBOLIC_POOL = ThreadPoolExecutor(max_workers=SYMBOLIC_WORKERS)
+# One slot per worker, held until the job really finishes (not just until the caller gives up)
+SYMBOLIC_SLOTS = threading.BoundedSemaphore(SYMBOLIC_WORKERS)
+
+class SymbolicTimeout(Exception):
+    """A bounded SymPy call ran out of time."""
+
+class SymbolicBusy(Exception):
+    """Every symbolic worker was taken, so the call never started; retrying later may succeed."""
+
+def bounded(fn, *args, timeout=SYMBOLIC_TIMEOUT):
+    # Raise rather than return a sentinel so st.cache_data never stores the miss.
+    # Reject instead of queueing: a queued job would spend its timeout waiting for a worker.
+    if not SYMBOLIC_SLOTS.acquire(blocking=False):
+        raise SymbolicBusy("all symbolic workers are busy")
+    try:
+        future = SYMBOLIC_POOL.submit(fn, *args)
+    except BaseException:
+        SYMBOLIC_SLOTS.release()
+        raise
+    future.add_done_callback(lambda _: SYMBOLIC_SLOTS.release())
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        raise SymbolicTimeout(f"{fn.__name__} exceeded {timeout}s") from None
+
+def to_float(value):
+    # Skip the evalf pass and the re() wrapper when the value is already a real number
+    value = value if value.is_Number else value.evalf()
+    return float(value) if value.is_extended_real else float(sp.re(value))
+
+@functools.lru_cache(maxsize=256)
+def parse_clean_expr(clean_expr):
+    # Module-level cache: lives across Streamlit reruns, and SymPy expressions are immutable
+    return sp.parse_expr(clean_expr, transformations=PARSE_TRANSFORMATIONS)
+
+def parse_function(func_str):
+    # Normalise first so 'x^2', 'x**2' and ' x^2 ' share one cache entry
+    clean_expr = func_str.replace('^', '**').strip()
+    return parse_clean_expr(clean_expr)
+
+@st.cache_data(show_spinner=False, max_entries=FUNCTION_CACHE_ENTRIES)
+def compute_antiderivative(func_str, aggressive=False):
+    # Depends only on f(x), so bound changes reuse it
+    f_expr = parse_function(func_str)
+
+    # SymbolicTimeout propagates: the caller shows the numeric result and retries next rerun
+    raw_indefinite = bounded(sp.integrate, f_expr, X)
+
+    # Targeted rewrites cover the usual tidy-up; full simplify() only on request
+    if aggressive:
+        try:
+            F_expr = bounded(sp.simplify, raw_indefinite)
+        except SymbolicTimeout:
+            F_expr = raw_indefinite
+    else:
+        try:
+            F_expr = sp.cancel(sp.together(raw_indefinite))
+            if F_expr.has(TrigonometricFunction):
+                F_expr = sp.trigsimp(F_expr)
+        except Exception:
+            F_expr = raw_indefinite
+    return f_expr, F_expr
+
+@st.cache_data(show_spinner=False, max_entries=FUNCTION_CACHE_ENTRIES)
+def steps_latex(func_str):
+    # Only reached from the PDF button. Kept in memory only: the walk is already capped by
+    # SYMBOLIC_TIMEOUT, and a timeout raises SymbolicTimeout so it is never cached.
+    return bounded(generate_step_latex, parse_function(func_str), X)
+
+def continuous_on(F_expr, lower_bound, upper_bound):
+    # F(b) - F(a) only equals the integral when F has no pole on [a, b] (tan, 1/x).
+    # A check that times out or can't decide counts as a pole: the caller then integrates directly.
+    interval = sp.Interval(*sorted((lower_bound, upper_bound)))
+    try:
+        return bounded(sp.singularities, F_expr, X, interval) is sp.S.EmptySet
+    except (SymbolicTimeout, NotImplementedError):
+        return False
+
+@st.cache_data(show_spinner=False, max_entries=BOUNDS_CACHE_ENTRIES)
+def compute_integral(func_str, lower_bound, upper_bound, aggressive=False):
+    f_expr, F_expr = compute_antiderivative(func_str, aggressive)
+
+    # Fundamental theorem: reuse F(b) - F(a) instead of integrating a second time,
+    # unless integrate() handed back an unevaluated Integral rather than a closed form
+    F_b = F_a = symbolic_value = None
+    if not F_expr.has(sp.Integral):
+        F_b = F_expr.subs(X, upper_bound).evalf()
+        F_a = F_expr.subs(X, lower_bound).evalf()
+        if continuous_on(F_expr, lower_bound, upper_bound):
+            try:
+                symbolic_value = to_float(F_b - F_a)
+            except TypeError:
+                pass
+    if symbolic_value is None:
+        definite_integral_raw = bounded(sp.integrate, f_expr, (X, lower_bound, upper_bound))
+        # evalf on a leftover Integral is unbounded mpmath quadrature; quad already covers it
+        if definite_integral_raw.has(sp.Integral):
+            symbolic_value = float('nan')
+        else:
+            try:
+                symbolic_value = to_float(definite_integral_raw)
+            except TypeError:
+                symbolic_value = float('nan')
+    return f_expr, F_expr, symbolic_value, F_b, F_a
+
+# One LatexPrinter per thread, reused by every print below. Not module-wide: printers keep
+# nesting state while they walk a tree, and Streamlit sessions run on separate threads.
+LATEX_PRINTERS = threading.local()
+
+def latex_printer():
+    printer = getattr(LATEX_PRINTERS, "printer", None)
+    if printer is None:
+        printer = LATEX_PRINTERS.printer = LatexPrinter()
+    return printer
+
+@st.cache_data(show_spinner=False, max_entries=FUNCTION_CACHE_ENTRIES)
+def function_latex(func_str):
+    # Needs no integration, so it is still available when the antiderivative times out
+    return latex_printer().doprint(parse_function(func_str))
+
+@st.cache_data(show_spinner=False, max_entries=FUNCTION_CACHE_ENTRIES)
+def antiderivative_latex(func_str, aggressive=False):
+    # f and F only change with the function, so bound edits reuse this entry
+    _, F_expr = compute_antiderivative(func_str, aggressive)
+    return function_latex(func_str), latex_printer().doprint(F_expr)
+
+@st.cache_data(show_spinner=False, max_entries=BOUNDS_CACHE_ENTRIES)
+def latex_forms(func_str, lower_bound, upper_bound, aggressive=False):
+    # Each LaTeX print walks the whole tree; print once per input and reuse everywhere
+    latex_f, latex_F = antiderivative_latex(func_str, aggressive)
+    _, _, _, F_b, F_a = compute_integral(func_str, lower_bound, upper_bound, aggressive)
+    if F_b is None:
+        return latex_f, latex_F, None, None
+    printer = latex_printer()
+    return latex_f, latex_F, printer.doprint(F_b), printer.doprint(F_a)
+
+@st.cache_resource(show_spinner=False, max_entries=FUNCTION_CACHE_ENTRIES)
+def build_evaluator(func_str):
+    f_expr = parse_function(func_str)
+    # Floated constants for the compiled backends, so exact Integers/Rationals become float64 literals
+    f_float = f_expr.evalf()
+
+    # JIT-compile a ufunc when numba is available; fall back to NumPy otherwise.
+    # target='cpu', not 'parallel': this object is shared by every session thread, and
+    # numba's default workqueue layer aborts the process on concurrent parallel calls.
+    numba = optional_module("numba")
+    if numba is not None:
+        try:
+            f_scalar = sp.lambdify(X, f_float, modules='math', cse=True)
+            return numba.vectorize(['float64(float64)'], target='cpu')(f_scalar)
+        except Exception:
+            pass
+
+    # numexpr evaluates the whole expression in one threaded, cache-blocked pass;
+    # unsupported functions only fail on call, so probe once before committing to it.
+    # No cse here: the numexpr printer emits evaluate() calls that cannot be assigned to.
+    if optional_module("numexpr") is not None:
+        try:
+            f_ne = sp.lambdify(X, f_float, modules='numexpr')
+            f_ne(np.ones(1))
+            return f_ne
+        except Exception:
+            pass
+
+    # Kept exact: evalf() turns sqrt into **0.5, which would bypass np.emath.sqrt
+    return sp.lambdify(X, f_expr, modules=[DOMAIN_SAFE_FUNCS, 'numpy'], cse=True)
+
+@st.cache_resource(show_spinner=False, max_entries=FUNCTION_CACHE_ENTRIES)
+def build_scalar_evaluator(func_str):
+    # quad calls the integrand one float at a time; a plain njit function skips the ufunc
+    # machinery that build_evaluator's array kernels pay on every single-element call
+    numba = optional_module("numba")
+    if numba is not None:
+        try:
+            f_scalar = sp.lambdify(X, parse_function(func_str).evalf(), modules='math', cse=True)
+            return numba.njit('float64(float64)')(f_scalar)
+        except Exception:
+            pass
+    return build_evaluator(func_str)
+
+@st.cache_data(show_spinner=False, max_entries=BOUNDS_CACHE_ENTRIES)
+def compute_numeric(func_str, lower_bound, upper_bound):
+    # Polynomials integrate exactly and cheaply, so F(b) - F(a) beats sampling.
+    # The simplify flag can't change the value, so it stays out of this cache key.
+    if parse_function(func_str).is_polynomial(X):
+        try:
+            return compute_integral(func_str, lower_bound, upper_bound)[2]
+        except (SymbolicTimeout, SymbolicBusy):
+            pass
+
+    # Adaptive quadrature on the lambdified integrand; independent of symbolic success.
+    # A divergent integral makes quad warn and return a meaningless finite number, so any
+    # IntegrationWarning or a large error estimate yields NaN and the caller falls back.
+    from scipy.integrate import quad, IntegrationWarning
+
+    f_num = build_scalar_evaluator(func_str)
+    try:
+        with np.errstate(all='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('error', IntegrationWarning)
+            value, err = quad(lambda v: float(np.real(f_num(v))), float(lower_bound), float(upper_bound), limit=200)
+    except Exception:
+        return float('nan')
+    if not np.isfinite(err) or err > 1e-6 * max(1.0, abs(value)):
+        return float('nan')
+    return value
+
+# --- Plot Sampling ---
+def scalar_or_nan(f_num):
+    def call(v):
+        try:
+            return complex(f_num(v))
+        except Exception:
+            return complex(np.nan)
+    return call
+
+def sample_real(f_num, xs):
+    # Evaluate the whole array in one call; keep only (near-)real samples
+    with np.errstate(invalid='ignore', divide='ignore'):
+        try:
+            y = np.broadcast_to(np.asarray(f_num(xs)), xs.shape)
+        except Exception:
+            # Scalar-only functions (e.g. math.gamma) fall back to an element-wise ufunc
+            y = np.frompyfunc(scalar_or_nan(f_num), 1, 1)(xs).astype(np.complex128)
+    if np.iscomplexobj(y):
+        y = np.where(np.abs(y.imag) < 1e-6, y.real, np.nan)
+    # Poles come back as +/-inf; blank them like any other undefined sample
+    y = np.asarray(y, dtype=np.float64)
+    return np.where(np.isfinite(y), y, np.nan)
+
+def refine_grid(f_num, x_plot, y_plot, max_points=1000, max_depth=5, tol=1e-3):
+    # Bisect intervals whose midpoint strays from the chord or that cross a domain edge
+    for _ in range(max_depth):
+        mid = 0.5 * (x_plot[:-1] + x_plot[1:])
+        y_mid = sample_real(f_num, mid)
+
+        finite = y_plot[np.isfinite(y_plot)]
+        span = np.ptp(finite) if finite.size else 0.0
+        with np.errstate(invalid='ignore'):
+            bent = np.abs(y_mid - 0.5 * (y_plot[:-1] + y_plot[1:])) > tol * (span or 1.0)
+        edge = np.isnan(y_plot[:-1]) != np.isnan(y_plot[1:])
+        refine = np.flatnonzero(bent | edge)[:max_points - x_plot.size]
+        if refine.size == 0:
+            break
+
+        x_plot = np.insert(x_plot, refine + 1, mid[refine])
+        y_plot = np.insert(y_plot, refine + 1, y_mid[refine])
+    return x_plot, y_plot
+
+def evaluate_grid(func_str, lower_bound, upper_bound, resolution=120):
+    # Coarse grid with both bounds on it, so the shaded area is a slice rather than a second sweep
+    a, b = sorted((lower_bound, upper_bound))
+    pad_points = resolution // 8
+    x_plot = np.concatenate([
+        np.linspace(a - 1, a, pad_points, endpoint=False),
+        np.linspace(a, b, resolution - 2 * pad_points),
+        np.linspace(b, b + 1, pad_points + 1)[1:],
+    ])
+    f_num = build_evaluator(func_str)
+    x_plot, y_plot = refine_grid(f_num, x_plot, sample_real(f_num, x_plot))
+
+    mask = (x_plot >= a) & (x_plot <= b)
+    return x_plot, y_plot, x_plot[mask], y_plot[mask]
+
+# --- Report Template ---
+REPORT_PREAMBLE = r"""\documentclass{article}
+\usepackage{amsmath}
+\usepackage{geometry}
+\geometry{margin=1in}
+"""
+
+# Literal LaTeX braces are doubled; single-brace fields are filled by format_map
+REPORT_BODY_TEMPLATE = r"""
+\begin{{document}}
+
+\begin{{center}}
+    \Large \textbf{{Integral Evaluation Report}}
+\end{{center}}
+
+\vspace{{0.5cm}}
+\textbf{{1. The Definite Integral Setup:}}
+\[ I = \int_{{{a}}}^{{{b}}} {f} \, dx \]
+
+\textbf{{2. Step-by-Step Breakdown:}}
+\begin{{itemize}}
+{steps}
+\end{{itemize}}
+
+\textbf{{3. The Antiderivative $F(x)$:}}
+After applying the steps and simplifying algebraically:
+\[ F(x) = {F} + C \]
+
+\textbf{{4. Applying the Fundamental Theorem of Calculus:}}
+\[ \int_{{{a}}}^{{{b}}} f(x) \, dx = F({b}) - F({a}) \]
+
+Evaluating at the upper bound $x = {b}$:
+\[ F({b}) = {Fb} \]
+
+Evaluating at the lower bound $x = {a}$:
+\[ F({a}) = {Fa} \]
+
+\textbf{{5. Final Result:}}
+\[ I = {result} \]
+
+\end{{document}}
+"""
+
+def build_report_tex(func_str, lower_bound, upper_bound, numerical_value, aggressive=False):
+    # Not cached itself: the pieces are, and a timed-out step walk must not stick
+    latex_f, latex_F, latex_Fb, latex_Fa = latex_forms(func_str, lower_bound, upper_bound, aggressive)
+    try:
+        steps = steps_latex(func_str)
+    except SymbolicTimeout:
+        steps = ALGEBRAIC_FALLBACK_STEP
+
+    return REPORT_PREAMBLE + REPORT_BODY_TEMPLATE.format_map({
+        'a': lower_bound,
+        'b': upper_bound,
+        'f': latex_f,
+        'steps': steps,
+        'F': latex_F,
+        'Fb': latex_Fb,
+        'Fa': latex_Fa,
+        'result': f"{numerical_value:.5f}",
+    })
+
+# --- PDF Compilation ---
+FORMAT_NAME = "integral_report"
+# Per-user cache rather than a fixed name under /tmp that any local user could pre-create and fill
+PDF_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "integral", "pdf")
+PDF_CACHE_MAX_ENTRIES = 256
+# In-process layer in front of the disk cache; only the recent reports need to skip the file read
+PDF_MEMORY_MAX_ENTRIES = 32
+# RAM-backed scratch space for the throwaway .tex/.aux/.log files when the host has it
+SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+# Set once a real report compiles with the full source but not with the format
+FORMAT_DISABLED = threading.Event()
+FORMAT_PROBE_BODY = r"""\begin{document}
+probe
+\end{document}
+"""
+
+@st.cache_resource(show_spinner=False)
+def preamble_format_dir():
+    # Dump the class/package preamble to a .fmt once per server so compiles skip loading it.
+    # Returns None when pdflatex isn't the backend, the dump fails, or the dumped format
+    # can't compile a trivial body, so an untried format never becomes the default path.
+    if shutil.which("tectonic") or not shutil.which("pdflatex"):
+        return None
+
+    fmt_dir = tempfile.mkdtemp(prefix="integral_fmt_")
+    with open(os.path.join(fmt_dir, "preamble.tex"), "w", encoding="utf-8") as f:
+        f.write(REPORT_PREAMBLE)
+    try:
+        subprocess.run(
+            ["pdflatex", "-ini", "-interaction=batchmode", f"-jobname={FORMAT_NAME}", "&pdflatex", r"preamble.tex\dump"],
+            cwd=fmt_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+        )
+    except (OSError, CalledProcessError):
+        return None
+    try:
+        run_latex(FORMAT_PROBE_BODY, use_format=True, env=format_env(fmt_dir))
+    except (OSError, CalledProcessError):
+        return None
+    return fmt_dir
+
+def format_env(fmt_dir):
+    # Trailing separator keeps the default search path after the format directory
+    return dict(os.environ, TEXFORMATS=fmt_dir + os.pathsep)
+
+def latex_command(tex_path, out_dir, use_format=False):
+    # tectonic is a single self-contained pass with a package cache; pdflatex is the fallback
+    if shutil.which("tectonic"):
+        return ["tectonic", "--chatter", "minimal", "--outdir", out_dir, tex_path]
+    # Single pass is enough (no refs/TOC); batchmode skips terminal output and stops at the first error
+    fmt_args = [f"-fmt={FORMAT_NAME}"] if use_format else []
+    return ["pdflatex", *fmt_args, "-interaction=batchmode", "-halt-on-error", "-no-shell-escape",
+            "-output-directory", out_dir, tex_path]
+
+def run_latex(tex_content, use_format=False, env=None):
+    # Per-call scratch directory: no shared files between sessions and nothing to clean up
+    with tempfile.TemporaryDirectory(dir=SCRATCH_DIR) as td:
+        tex_path = os.path.join(td, "solution.tex")
+        with open(tex_path, "w", encoding="utf-8") as f:
+            f.write(tex_content)
+
+        try:
+            subprocess.run(
+                latex_command(tex_path, td, use_format),
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, check=True, env=env
+            )
+        except CalledProcessError as e:
+            # batchmode writes its diagnostics to the .log rather than stdout
+            log_path = os.path.join(td, "solution.log")
+            if os.path.exists(log_path):
+                with open(log_path, encoding="utf-8", errors="replace") as f:
+                    e.output = f.read()
+            raise
+        with open(os.path.join(td, "solution.pdf"), "rb") as f:
+            return f.read()
+
+def compile_tex(tex_content):
+    fmt_dir = None if FORMAT_DISABLED.is_set() else preamble_format_dir()
+    if fmt_dir is None or not tex_content.startswith(REPORT_PREAMBLE):
+        return run_latex(tex_content)
+
+    # The preamble already lives in the format; compile only the body
+    try:
+        return run_latex(tex_content[len(REPORT_PREAMBLE):], use_format=True, env=format_env(fmt_dir))
+    except CalledProcessError:
+        pass
+    # If the full source compiles where the format run failed, the format is to blame:
+    # stop using it for the rest of the process instead of paying a failing run per report
+    pdf_data = run_latex(tex_content)
+    FORMAT_DISABLED.set()
+    return pdf_data
+
+def private_cache_dir():
+    # Only trust a real directory we own that nobody else can write to; otherwise skip the disk cache
+    try:
+        os.makedirs(PDF_CACHE_DIR, mode=0o700, exist_ok=True)
+        info = os.lstat(PDF_CACHE_DIR)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        return None
+    return PDF_CACHE_DIR
+
+def evict_old_pdfs(cache_dir):
+    # Keep the newest PDF_CACHE_MAX_ENTRIES by mtime; hits touch their file, so this is roughly LRU
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".pdf"):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+    entries.sort(reverse=True)
+    for _, path in entries[PDF_CACHE_MAX_ENTRIES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@st.cache_data(show_spinner=False, max_entries=PDF_MEMORY_MAX_ENTRIES)
+def build_pdf(tex_content):
+    # Disk cache keyed on the full source survives restarts and is shared by every worker
+    cache_dir = private_cache_dir()
+    if cache_dir is None:
+        return compile_tex(tex_content)
+
+    key = hashlib.blake2b(tex_content.encode("utf-8"), digest_size=16).hexdigest()
+    cached_path = os.path.join(cache_dir, f"{key}.pdf")
+    try:
+        with open(cached_path, "rb") as f:
+            pdf_data = f.read()
+        os.utime(cached_path)
+        return pdf_data
+    except OSError:
+        pass
+
+    pdf_data = compile_tex(tex_content)
+
+    partial_path = f"{cached_path}.{os.getpid()}.part"
+    try:
+        with open(partial_path, "wb") as f:
+            f.write(pdf_data)
+        os.replace(partial_path, cached_path)
+        evict_old_pdfs(cache_dir)
+    except OSError:
+        pass
+    return pdf_data